@@ -1,6 +1,7 @@
 # Example of how to use the updated BO loop without CSV upload to OT2
 # This shows how to integrate the new protocol generation system
 
+import logging
 import numpy as np
 import pandas as pd
 from protocol_generator import generate_protocol_from_dataframe, update_csv_data_handler
@@ -62,11 +63,16 @@ def generate_sample_bo_data(iteration):
     
     n_experiments = 3 + iteration  # Increase experiments each iteration
     
+    # 96-well plate positions filled row by row (A1..A12, B1..H12), built in one vectorized pass
+    idx = np.arange(n_experiments)
+    rows = np.array(list('ABCDEFGH'))[idx // 12]
+    cols = (idx % 12 + 1).astype(str)
+    
     data = {
         'colorA': np.random.uniform(20, 150, n_experiments).round(1),
         'colorB': np.random.uniform(80, 180, n_experiments).round(1),
         'colorC': np.random.uniform(50, 200, n_experiments).round(1),
-        'DispensePos': [f"{chr(65 + i//12)}{1 + i%12}" for i in range(n_experiments)]
+        'DispensePos': np.char.add(rows, cols).tolist()
     }
     
     return pd.DataFrame(data)
@@ -85,22 +91,20 @@ def demonstrate_protocol_content():
         print(f"\n📄 {protocol}:")
         print("-" * 40)
         
-        with open(protocol, 'r') as f:
-            lines = f.readlines()
-            
-        # Find and show the BO_DATA section
+        # Find and show the BO_DATA section, reading only up to its closing brace
         in_data_section = False
         data_lines = []
         
-        for line in lines:
-            if "# BO ITERATION DATA" in line:
-                in_data_section = True
-                data_lines.append(line.strip())
-            elif in_data_section and line.strip().startswith('}'):
-                data_lines.append(line.strip())
-                break
-            elif in_data_section:
-                data_lines.append(line.strip())
+        with open(protocol, 'r') as f:
+            for line in f:
+                if "# BO ITERATION DATA" in line:
+                    in_data_section = True
+                    data_lines.append(line.strip())
+                elif in_data_section and line.strip().endswith('}'):
+                    data_lines.append(line.strip())
+                    break
+                elif in_data_section:
+                    data_lines.append(line.strip())
         
         for line in data_lines[:10]:  # Show first 10 lines of data section
             print(f"  {line}")
@@ -108,6 +112,8 @@ def demonstrate_protocol_content():
             print(f"  ... ({len(data_lines)-10} more lines)")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     print("🧪 BO LOOP EXAMPLE WITH DYNAMIC PROTOCOL GENERATION")
     print("="*60)
     
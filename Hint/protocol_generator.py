@@ -4,8 +4,66 @@ Generates dynamic protocol files with embedded data for each BO iteration
 """
 import pandas as pd
 import os
+import io
+import re
 import json
-from typing import Dict, List, Union
+import hashlib
+import logging
+import functools
+from typing import Dict, List, Optional, Tuple, Union
+
+# Placeholder block in the base protocol that gets swapped for each iteration's data
+BO_DATA_MARKER = "    # BO ITERATION DATA - WILL BE REPLACED DYNAMICALLY\n    BO_DATA = {"
+BASE_PROTOCOL_PATH = "color_mixing.py"
+BO_COLUMNS = ['colorA', 'colorB', 'colorC', 'DispensePos']
+_BO_R_RE = re.compile(r'BO_R(\d+)')
+
+log = logging.getLogger(__name__)
+
+def _load_base_protocol(path: str) -> Tuple[str, Optional[str], str]:
+    """
+    Return the base protocol template split around the BO_DATA block
+    
+    The parsed template is cached until the file's modification time or size
+    changes, so edits to the template are picked up within the same session.
+    
+    Returns:
+        tuple: (head, tail, template_hash) where head and tail surround the
+        placeholder block (tail is None if the template has no placeholder) and
+        template_hash is a hash of the raw template text
+    """
+    st = os.stat(path)
+    return _read_base_protocol(os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+@functools.lru_cache(maxsize=1)
+def _read_base_protocol(path: str, mtime_ns: int, size: int) -> Tuple[str, Optional[str], str]:
+    """Read and split the base protocol; mtime_ns and size only key the cache"""
+    with open(path, 'r') as f:
+        protocol_content = f.read()
+    template_hash = hashlib.blake2b(protocol_content.encode('utf-8'), digest_size=8).hexdigest()
+    
+    # Marker is a plain literal, no regex needed
+    start = protocol_content.find(BO_DATA_MARKER)
+    if start != -1:
+        end = protocol_content.find('}', start + len(BO_DATA_MARKER))
+        if end != -1:
+            return protocol_content[:start], protocol_content[end + 1:], template_hash
+    return protocol_content, None, template_hash
+
+def _read_csv_with_hash(csv_file_path: str) -> Tuple[pd.DataFrame, str]:
+    """Read a BO CSV file once, returning the DataFrame and a hash of its raw bytes"""
+    with open(csv_file_path, 'rb') as f:
+        raw = f.read()
+    src_hash = hashlib.blake2b(raw, digest_size=8).hexdigest()
+    return pd.read_csv(io.BytesIO(raw)), src_hash
+
+def _protocol_is_current(protocol_path: str, header: str) -> bool:
+    """Check whether an existing protocol starts with this source-hash header line"""
+    try:
+        with open(protocol_path, 'r', encoding='utf-8') as f:
+            return f.readline() == header
+    except OSError:
+        return False
 
 def generate_protocol_from_csv(csv_file_path: str, iteration_number: int, output_dir: str = ".") -> str:
     """
@@ -22,61 +80,18 @@ def generate_protocol_from_csv(csv_file_path: str, iteration_number: int, output
     
     # Read the CSV data
     try:
-        df = pd.read_csv(csv_file_path)
-        print(f"✅ Loaded CSV data from {csv_file_path}")
-        print(f"Data shape: {df.shape}")
-        print(f"Columns: {list(df.columns)}")
+        df, src_hash = _read_csv_with_hash(csv_file_path)
+        log.info("✅ Loaded CSV data from %s", csv_file_path)
+        log.debug("Data shape: %s", df.shape)
+        log.debug("Columns: %s", list(df.columns))
     except Exception as e:
-        print(f"❌ Error reading CSV file: {e}")
+        log.error("❌ Error reading CSV file: %s", e)
         return None
     
-    # Convert DataFrame to dictionary format
-    bo_data = {
-        'colorA': df['colorA'].tolist(),
-        'colorB': df['colorB'].tolist(), 
-        'colorC': df['colorC'].tolist(),
-        'DispensePos': df['DispensePos'].tolist()
-    }
-    
-    # Generate the protocol filename
-    protocol_filename = f"color_mixing_BO{iteration_number}.py"
-    protocol_path = os.path.join(output_dir, protocol_filename)
-    
-    # Read the base protocol template
-    base_protocol_path = "color_mixing.py"
-    try:
-        with open(base_protocol_path, 'r') as f:
-            protocol_content = f.read()
-    except Exception as e:
-        print(f"❌ Error reading base protocol: {e}")
-        return None
-    
-    # Replace the BO_DATA section with actual data
-    data_section = f"""    # BO ITERATION DATA - BO{iteration_number}
-    BO_DATA = {json.dumps(bo_data, indent=8).replace('{', '{\n        ').replace('}', '\n    }')}"""
-    
-    # Find and replace the BO_DATA section
-    import re
-    pattern = r'    # BO ITERATION DATA - WILL BE REPLACED DYNAMICALLY\n    BO_DATA = \{[^}]+\}'
-    updated_content = re.sub(pattern, data_section, protocol_content, flags=re.MULTILINE | re.DOTALL)
-    
-    # Update the protocol name in metadata
-    updated_content = updated_content.replace(
-        "'protocolName': 'Color Liquid Mixing - Bayesian Optimization',",
-        f"'protocolName': 'Color Liquid Mixing - BO Iteration {iteration_number}',"
-    )
-    
-    # Save the generated protocol
-    try:
-        with open(protocol_path, 'w') as f:
-            f.write(updated_content)
-        print(f"✅ Generated protocol file: {protocol_path}")
-        return protocol_path
-    except Exception as e:
-        print(f"❌ Error writing protocol file: {e}")
-        return None
+    return generate_protocol_from_dataframe(df, iteration_number, output_dir, src_hash=src_hash)
 
-def generate_protocol_from_dataframe(df: pd.DataFrame, iteration_number: int, output_dir: str = ".") -> str:
+def generate_protocol_from_dataframe(df: pd.DataFrame, iteration_number: int, output_dir: str = ".",
+                                     src_hash: Optional[str] = None) -> str:
     """
     Generate a protocol file directly from a DataFrame for a specific BO iteration
     
@@ -84,59 +99,70 @@ def generate_protocol_from_dataframe(df: pd.DataFrame, iteration_number: int, ou
         df: DataFrame containing BO data with columns: colorA, colorB, colorC, DispensePos
         iteration_number: BO iteration number
         output_dir: Directory to save the protocol file
+        src_hash: Hash of the source CSV; if the existing protocol was generated from
+            the same data and the same base template it is reused instead of being
+            regenerated
         
     Returns:
         str: Path to the generated protocol file
     """
     
-    # Convert DataFrame to dictionary format
-    bo_data = {
-        'colorA': df['colorA'].tolist(),
-        'colorB': df['colorB'].tolist(), 
-        'colorC': df['colorC'].tolist(),
-        'DispensePos': df['DispensePos'].tolist()
-    }
-    
-    print(f"✅ Processing DataFrame data for BO{iteration_number}")
-    print(f"Data shape: {df.shape}")
-    print(f"Experiments: {len(bo_data['colorA'])}")
-    
     # Generate the protocol filename
     protocol_filename = f"color_mixing_BO{iteration_number}.py"
     protocol_path = os.path.join(output_dir, protocol_filename)
     
-    # Read the base protocol template
-    base_protocol_path = "color_mixing.py"
+    # Read the base protocol template (cached until the file changes)
     try:
-        with open(base_protocol_path, 'r') as f:
-            protocol_content = f.read()
+        head, tail, template_hash = _load_base_protocol(BASE_PROTOCOL_PATH)
     except Exception as e:
-        print(f"❌ Error reading base protocol: {e}")
+        log.error("❌ Error reading base protocol: %s", e)
         return None
     
-    # Replace the BO_DATA section with actual data
-    data_section = f"""    # BO ITERATION DATA - BO{iteration_number}
-    BO_DATA = {json.dumps(bo_data, indent=8).replace('{', '{\n        ').replace('}', '\n    }')}"""
-    
-    # Find and replace the BO_DATA section
-    import re
-    pattern = r'    # BO ITERATION DATA - WILL BE REPLACED DYNAMICALLY\n    BO_DATA = \{[^}]+\}'
-    updated_content = re.sub(pattern, data_section, protocol_content, flags=re.MULTILINE | re.DOTALL)
-    
-    # Update the protocol name in metadata
-    updated_content = updated_content.replace(
-        "'protocolName': 'Color Liquid Mixing - Bayesian Optimization',",
-        f"'protocolName': 'Color Liquid Mixing - BO Iteration {iteration_number}',"
-    )
+    # Skip regeneration if the protocol already reflects this CSV data and template
+    header = None
+    if src_hash is not None:
+        header = f"# src_hash={src_hash}-{template_hash}\n"
+        if _protocol_is_current(protocol_path, header):
+            log.info("✅ Protocol already up to date: %s", protocol_path)
+            return protocol_path
     
-    # Save the generated protocol
+    # Convert DataFrame to dictionary format
+    bo_data = df[BO_COLUMNS].to_dict(orient='list')
+    
+    log.info("✅ Processing DataFrame data for BO%d", iteration_number)
+    log.debug("Data shape: %s", df.shape)
+    log.debug("Experiments: %d", len(df))
+    
+    # Update the protocol name in metadata, whichever side of BO_DATA it is on
+    base_name = "'protocolName': 'Color Liquid Mixing - Bayesian Optimization',"
+    iteration_name = f"'protocolName': 'Color Liquid Mixing - BO Iteration {iteration_number}',"
+    head = head.replace(base_name, iteration_name)
+    if tail is not None:
+        tail = tail.replace(base_name, iteration_name)
+    
+    # Write head, data and tail to a temp file and move it into place only once
+    # every write succeeded, so a failed write never leaves a truncated protocol.
+    # The temp file is created with mode 0o666 so the umask applies, as with open(..., 'w')
+    tmp_path = None
     try:
-        with open(protocol_path, 'w') as f:
-            f.write(updated_content)
-        print(f"✅ Generated protocol file: {protocol_path}")
+        candidate = os.path.join(output_dir, f".{protocol_filename}.{os.urandom(4).hex()}.tmp")
+        fd = os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        tmp_path = candidate
+        with open(fd, 'w', encoding='utf-8', newline='\n') as f:
+            if header is not None:
+                f.write(header)
+            f.write(head)
+            if tail is not None:
+                f.write(f"    # BO ITERATION DATA - BO{iteration_number}\n    BO_DATA = ")
+                f.write(json.dumps(bo_data, separators=(',', ':')))
+                f.write(tail)
+        os.replace(tmp_path, protocol_path)
+        log.info("✅ Generated protocol file: %s", protocol_path)
         return protocol_path
     except Exception as e:
-        print(f"❌ Error writing protocol file: {e}")
+        log.error("❌ Error writing protocol file: %s", e)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return None
 
 def update_csv_data_handler(csv_file_path: str, robot_filename: str = None) -> str:
@@ -152,34 +178,33 @@ def update_csv_data_handler(csv_file_path: str, robot_filename: str = None) -> s
     """
     try:
         # Extract iteration number from filename (e.g., BO_R1.csv -> 1)
-        import re
-        match = re.search(r'BO_R(\d+)', csv_file_path)
+        match = _BO_R_RE.search(csv_file_path)
         if match:
             iteration_number = int(match.group(1))
         else:
             iteration_number = 0  # Default to 0 if no iteration found
         
-        # Generate protocol file from CSV
-        protocol_path = generate_protocol_from_csv(csv_file_path, iteration_number)
+        # Load the CSV once and generate the protocol file from it
+        df, src_hash = _read_csv_with_hash(csv_file_path)
+        protocol_path = generate_protocol_from_dataframe(df, iteration_number, src_hash=src_hash)
         
         if protocol_path:
-            # Also load and display the data for verification
-            df = pd.read_csv(csv_file_path)
-            print(f"✅ CSV data processed successfully!")
-            print(f"Data shape: {df.shape}")
-            print(f"Columns: {list(df.columns)}")
-            print("First few rows:")
-            print(df.head())
-            print(f"📄 Protocol file generated: {protocol_path}")
+            # Log the data for verification (preview only formatted at DEBUG level)
+            log.info("✅ CSV data processed successfully!")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Data shape: %s", df.shape)
+                log.debug("Columns: %s", list(df.columns))
+                log.debug("First few rows:\n%s", df.head())
+            log.info("📄 Protocol file generated: %s", protocol_path)
             return protocol_path
         else:
             return None
             
     except FileNotFoundError:
-        print(f"❌ CSV file not found: {csv_file_path}")
+        log.error("❌ CSV file not found: %s", csv_file_path)
         return None
     except Exception as e:
-        print(f"❌ Error processing CSV: {e}")
+        log.error("❌ Error processing CSV: %s", e)
         return None
 
 # Example usage and testing functions
@@ -219,6 +244,8 @@ def create_sample_bo_data():
     return protocol_path
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Test the protocol generation
     print("🧪 Testing protocol generation...")
     test_protocol_generation()